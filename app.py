@@ -2,13 +2,21 @@
 Streamlit UI for RAG Chatbot with conversation history support
 """
 
-import os
+import re
 import time 
-import tempfile
+import hashlib
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 from rag_chatbot import RAGChatbot
+from utils.event_loop import run_sync
 from utils.document_base_manager import DocumentBaseManager
 
+# Number of characters revealed per update when simulating streaming
+STREAM_CHUNK_SIZE = 24
+
+# Maximum number of chat messages kept in session state
+MAX_CHAT_MESSAGES = 50
 
 # Set page configuration
 st.set_page_config(
@@ -18,8 +26,7 @@ st.set_page_config(
 )
 
 # CSS for styling
-def get_css():
-    return """
+CSS_HTML = """
     <style>
         /* Remove hardcoded colors to respect theme */
         .stApp {
@@ -107,9 +114,13 @@ def get_css():
     </style>
     """
 
+# The <style> element has to be re-emitted on every rerun (Streamlit drops
+# elements a run doesn't produce), so strip comments and whitespace once
+# here to keep that per-rerun payload small
+CSS_HTML = re.sub(r"/\*.*?\*/|\s*\n\s*", "", CSS_HTML, flags=re.S)
+
 # HTML components
-def get_about_html():
-    return """
+ABOUT_HTML = """
     <div style="background-color: #F8F9FA; padding: 15px; border-radius: 6px; border: 1px solid #EAEAEA;">
         <h3 style="color: #333333;">About</h3>
         <p>This RAG Chatbot uses:</p>
@@ -120,8 +131,8 @@ def get_about_html():
         </ul>
     </div>
     """
-def get_retrieval_settings_info():
-    return """
+
+RETRIEVAL_SETTINGS_INFO_HTML = """
     <div style="background-color: #F8F9FA; padding: 15px; border-radius: 6px; border: 1px solid #EAEAEA; margin-top: 10px;">
         <h4 style="color: #333333;">About Top K Setting</h4>
         <p>The "top k" value controls how many document chunks are retrieved when answering your questions:</p>
@@ -134,34 +145,63 @@ def get_retrieval_settings_info():
     </div>
     """
 
-def get_chat_header_html():
-    return """
+CHAT_HEADER_HTML = """
     <div style="background-color: #F8F9FA; padding: 15px; border-radius: 6px; border: 1px solid #EAEAEA;">
         <h2 style="color: #333333;">Chat with your Documents</h2>
     </div>
     """
 
-def get_config_header_html():
-    return '<h3>Configuration</h3>'
+CONFIG_HEADER_HTML = '<h3>Configuration</h3>'
 
-def get_upload_header_html():
-    return '<h3>Upload Documents</h3>'
+UPLOAD_HEADER_HTML = '<h3>Upload Documents</h3>'
 
-# Initialize session state variables
-if "messages" not in st.session_state:
-    st.session_state.messages = []
+@st.cache_data(ttl=30)
+def _list_bases(_manager):
+    """List document bases, cached across reruns (cleared when bases change)."""
+    return _manager.list_document_bases()
 
-if "chatbot" not in st.session_state:
-    st.session_state.chatbot = None
+def _create_chatbot(api_key: str, base_name: Optional[str], manager: DocumentBaseManager):
+    """Build a chatbot for this session; it holds the session's conversation history."""
+    return RAGChatbot(
+        openai_api_key=api_key,
+        document_base_name=base_name,
+        document_base_manager=manager
+    )
 
-if "documents_loaded" not in st.session_state:
-    st.session_state.documents_loaded = False
+@st.cache_resource
+def _get_executor():
+    """Thread pool for background document processing, shared across reruns."""
+    return ThreadPoolExecutor(max_workers=2)
 
-if "document_base_manager" not in st.session_state:
-    st.session_state.document_base_manager = DocumentBaseManager()
+@st.cache_resource
+def _get_document_base_manager():
+    """Create the document base manager once and share it across reruns and sessions."""
+    return DocumentBaseManager()
+
+# Session state defaults (factories, so mutable values aren't shared)
+SESSION_DEFAULTS = {
+    "messages": list,
+    "chatbot": lambda: None,
+    "documents_loaded": lambda: False,
+    "seen_hashes": dict,
+    "processing_job": lambda: None,
+    "pending_toast": lambda: None,
+    "document_base_manager": _get_document_base_manager,
+}
+
+# Initialize session state variables
+for key, factory in SESSION_DEFAULTS.items():
+    if key not in st.session_state:
+        st.session_state[key] = factory()
 
 # Apply CSS styling
-st.markdown(get_css(), unsafe_allow_html=True)
+st.markdown(CSS_HTML, unsafe_allow_html=True)
+
+# Show a notification queued just before the previous rerun
+if st.session_state.pending_toast:
+    message, icon = st.session_state.pending_toast
+    st.toast(message, icon=icon)
+    st.session_state.pending_toast = None
 
 # Function to initialize the chatbot
 def initialize_chatbot():
@@ -175,47 +215,74 @@ def initialize_chatbot():
         selected_base = st.session_state.get("current_base")
 
         # Initialize the chatbot with the provided API key
-        st.session_state.chatbot = RAGChatbot(openai_api_key=api_key)
+        st.session_state.chatbot = _create_chatbot(
+            api_key, selected_base, st.session_state.document_base_manager
+        )
         return True
     except Exception as e:
         st.error(f"Error initializing chatbot: {str(e)}")
         return False
 
 # Function to process uploaded files
-def process_uploaded_files(uploaded_files):
+def process_uploaded_files(uploaded_files, batch_size=256):
     if not st.session_state.chatbot:
         st.error("Please initialize the chatbot first.")
         return
     
-    with st.spinner("Processing documents..."):
-        temp_dir = tempfile.mkdtemp()
-        file_paths = []
-        
-        # Save uploaded files to temporary directory
-        for uploaded_file in uploaded_files:
-            file_path = os.path.join(temp_dir, uploaded_file.name)
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            file_paths.append(file_path)
-        
-        # Load documents into the chatbot
+    # Use current document base if available
+    document_base_name = st.session_state.get("current_base")
+    
+    # Content hashes already indexed in this document base
+    seen_hashes = st.session_state.seen_hashes.setdefault(document_base_name, set())
+    if document_base_name:
         try:
-        # Use current document base if available
-            document_base_name = st.session_state.get("current_base")
-            
-            num_chunks = st.session_state.chatbot.load_documents(
-                file_paths=file_paths,
-                document_base_name=document_base_name
-            )
-            st.session_state.documents_loaded = True
-            st.success(f"Successfully processed {len(uploaded_files)} documents with {num_chunks} chunks.")
-        except Exception as e:
-            st.error(f"Error processing documents: {str(e)}")
+            seen_hashes.update(st.session_state.document_base_manager.get_content_hashes(document_base_name))
+        except KeyError:
+            pass
+    
+    # Skip files whose exact contents have already been embedded
+    files = []
+    content_hashes = []
+    skipped = []
+    for uploaded_file in uploaded_files:
+        # Hash the upload's buffer in place rather than copying it out
+        content_hash = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+        if content_hash in seen_hashes or content_hash in content_hashes:
+            skipped.append(uploaded_file.name)
+            continue
+        # Hand the uploaded file itself to the loaders (no temp files, no copy)
+        files.append((uploaded_file.name, uploaded_file))
+        content_hashes.append(content_hash)
+    
+    if skipped:
+        st.toast(f"Already indexed, skipped: {', '.join(skipped)}", icon="ℹ️")
+    if not files:
+        return
+    
+    # Index in a background thread so the UI stays usable meanwhile; the
+    # hashes are marked as seen now so re-submitting doesn't queue them twice,
+    # and narrowed to the files actually indexed once the job finishes
+    seen_hashes.update(content_hashes)
+    future = _get_executor().submit(
+        st.session_state.chatbot.load_documents_from_bytes,
+        files,
+        document_base_name=document_base_name,
+        batch_size=batch_size,
+        content_hashes=content_hashes
+    )
+    st.session_state.processing_job = {
+        "future": future,
+        "num_files": len(files),
+        "document_base_name": document_base_name,
+        "content_hashes": content_hashes
+    }
 
 # Function to handle asking questions
 def ask_question(question):
     if not st.session_state.chatbot:
         return "Please initialize the chatbot with your OpenAI API key first."
+    elif st.session_state.processing_job is not None:
+        return "Documents are still being processed. Please ask again once processing finishes."
     elif not st.session_state.documents_loaded:
         return "Please upload and process documents before asking questions."
     else:
@@ -223,9 +290,10 @@ def ask_question(question):
             # Get top_k from session state or use default
             top_k = st.session_state.get("top_k", 6)
 
-            # Use the synchronous version for Streamlit compatibility
+            # Run the async version on the shared event loop, which owns the
+            # OpenAI clients' connections
             # The internal context handling will be hidden from the UI
-            answer = st.session_state.chatbot.ask_sync(question, top_k=top_k)
+            answer = run_sync(st.session_state.chatbot.ask(question, top_k=top_k))
             return answer
         except Exception as e:
             return f"Error generating response: {str(e)}"
@@ -239,13 +307,8 @@ Upload PDF, Word, or Excel files, then ask questions about their content.
 
 # Sidebar for API key and file upload
 with st.sidebar:
-    if "document_bases" not in st.session_state:
-        st.session_state.document_bases = st.session_state.document_base_manager.list_document_bases()
-
-    document_bases = st.session_state.document_bases
-    base_names = [base["name"] for base in document_bases]
     # Configuration header
-    st.markdown(get_config_header_html(), unsafe_allow_html=True)
+    st.markdown(CONFIG_HEADER_HTML, unsafe_allow_html=True)
     
     # OpenAI API key input
     openai_api_key = st.text_input(
@@ -255,8 +318,12 @@ with st.sidebar:
         help="Enter your OpenAI API key to use the chatbot."
     )
     
+    # The chatbot is being updated by a background job; don't replace or
+    # modify it until the job finishes
+    processing = st.session_state.processing_job is not None
+    
     # Initialize button
-    init_button = st.button("Initialize Chatbot")
+    init_button = st.button("Initialize Chatbot", disabled=processing)
     if init_button:
         if initialize_chatbot():
             st.success("Chatbot initialized successfully!")
@@ -267,8 +334,9 @@ with st.sidebar:
     st.markdown("<h3>Document Bases</h3>", unsafe_allow_html=True)
     
     # Get available document bases
-    document_bases = st.session_state.document_base_manager.list_document_bases()
-    base_names = [base["name"] for base in document_bases]
+    document_bases = _list_bases(st.session_state.document_base_manager)
+    bases_by_name = {base["name"]: base for base in document_bases}
+    base_names = list(bases_by_name)
     
     # Add selection dropdown
     selected_base = st.selectbox(
@@ -282,18 +350,22 @@ with st.sidebar:
         new_base_name = st.text_input("New Document Base Name")
         new_base_desc = st.text_area("Description (optional)")
         
-        if st.button("Create Document Base") and new_base_name:
+        if st.button("Create Document Base", disabled=processing) and new_base_name:
             try:
                 st.session_state.document_base_manager.create_document_base(new_base_name, new_base_desc)
+                st.session_state.document_base_manager.flush()
+                _list_bases.clear()
                 st.success(f"Created new document base: {new_base_name}")
                 
                 # Initialize chatbot with new document base if API key is set
                 if st.session_state.get("openai_api_key"):
-                    st.session_state.chatbot = RAGChatbot(
-                        openai_api_key=st.session_state.openai_api_key,
-                        document_base_name=new_base_name,
-                        document_base_manager=st.session_state.document_base_manager
-                    )
+                    if (st.session_state.get("current_base") != new_base_name
+                            or st.session_state.chatbot is None):
+                        st.session_state.chatbot = _create_chatbot(
+                            st.session_state.openai_api_key,
+                            new_base_name,
+                            st.session_state.document_base_manager
+                        )
                     st.session_state.current_base = new_base_name
                     st.rerun()
             except ValueError as e:
@@ -301,7 +373,7 @@ with st.sidebar:
 
     # Add this after displaying info about the selected document base
     if selected_base != "Create New":
-        base_info = next((base for base in document_bases if base["name"] == selected_base), None)
+        base_info = bases_by_name.get(selected_base)
         if base_info:
             st.info(f"Documents: {base_info['num_documents']}\nChunks: {base_info['num_chunks']}")
             
@@ -310,15 +382,18 @@ with st.sidebar:
             
             with col1:
                 # Load button
-                if st.button("Load Base"):
-                    st.session_state.chatbot = RAGChatbot(
-                        openai_api_key=st.session_state.openai_api_key,
-                        document_base_name=selected_base,
-                        document_base_manager=st.session_state.document_base_manager
-                    )
+                if st.button("Load Base", disabled=processing):
+                    # Only rebuild if a different base (or no chatbot) is active
+                    if (st.session_state.get("current_base") != selected_base
+                            or st.session_state.chatbot is None):
+                        st.session_state.chatbot = _create_chatbot(
+                            st.session_state.openai_api_key,
+                            selected_base,
+                            st.session_state.document_base_manager
+                        )
                     
-                    # Set documents_loaded based on whether retriever was initialized
-                    if st.session_state.chatbot.retriever is not None:
+                    # Set documents_loaded based on whether the base holds documents
+                    if st.session_state.chatbot.has_documents:
                         st.session_state.documents_loaded = True
                         st.success(f"Loaded document base: {selected_base}")
                     else:
@@ -330,12 +405,13 @@ with st.sidebar:
             
             with col2:
                 # Delete button
-                if st.button("Delete Base", type="secondary"):
+                if st.button("Delete Base", type="secondary", disabled=processing):
                     delete_confirmed = st.checkbox("Confirm deletion")
                     
                     if delete_confirmed:
                         try:
                             st.session_state.document_base_manager.delete_document_base(selected_base)
+                            st.session_state.document_base_manager.flush()
                             
                             # Reset if we were using this base
                             if st.session_state.get("current_base") == selected_base:
@@ -345,13 +421,13 @@ with st.sidebar:
                                     st.session_state.chatbot = None
                             
                             st.success(f"Deleted document base: {selected_base}")
-                            st.session_state.document_bases = None
+                            _list_bases.clear()
                             st.rerun()
                         except Exception as e:
                             st.error(f"Error deleting document base: {str(e)}")
     
     # File uploader
-    st.markdown(get_upload_header_html(), unsafe_allow_html=True)
+    st.markdown(UPLOAD_HEADER_HTML, unsafe_allow_html=True)
         
     uploaded_files = st.file_uploader(
         "Upload PDF, Word, or Excel files",
@@ -364,32 +440,41 @@ with st.sidebar:
     # Retrieval settings
     st.markdown("<h3>Retrieval Settings</h3>", unsafe_allow_html=True)
     
-    # Add slider for top_k parameter
-    top_k = st.slider(
-        "Number of chunks to retrieve (top k)",
-        min_value=1,
-        max_value=20,
-        value=6,  # Default value from vector_store.py
-        step=1,
-        help="Controls how many document chunks are retrieved when answering. Higher values may give more comprehensive answers but increase token usage."
-    )
+    # Add slider for top_k parameter inside a form so dragging it
+    # doesn't rerun the script on every tick, only when applied
+    with st.form("retrieval_settings"):
+        top_k = st.slider(
+            "Number of chunks to retrieve (top k)",
+            min_value=1,
+            max_value=20,
+            value=6,  # Default value from vector_store.py
+            step=1,
+            help="Controls how many document chunks are retrieved when answering. Higher values may give more comprehensive answers but increase token usage."
+        )
+        st.form_submit_button("Apply")
     
     # Store in session state
     st.session_state.top_k = top_k
 
-    # st.markdown(get_retrieval_settings_info(), unsafe_allow_html=True)
+    # st.markdown(RETRIEVAL_SETTINGS_INFO_HTML, unsafe_allow_html=True)
     
     # Process button
     if uploaded_files:
-        process_button = st.button("Process Documents")
+        process_button = st.button(
+            "Process Documents",
+            disabled=processing
+        )
         if process_button:
             process_uploaded_files(uploaded_files)
     
     # Clear documents button
     if st.session_state.documents_loaded:
-        if st.button("Clear Documents"):
+        if st.button("Clear Documents", disabled=processing):
             if st.session_state.chatbot:
                 st.session_state.chatbot.clear_documents()
+                st.session_state.document_base_manager.flush()
+                st.session_state.seen_hashes.pop(st.session_state.get("current_base"), None)
+                _list_bases.clear()
                 st.session_state.documents_loaded = False
                 st.success("All documents have been cleared.")
     
@@ -400,54 +485,106 @@ with st.sidebar:
             st.session_state.chatbot.clear_history()
         st.success("Chat history cleared.")
 
-# Display chat messages from session state
-chat_container = st.container()
-with chat_container:
-    for message in st.session_state.messages:
-        with st.chat_message(message["role"]):
-            st.write(message["content"])
+# Chat section runs as a fragment: submitting a question reruns only
+# this block, not the sidebar and the rest of the page
+@st.fragment
+def render_chat():
+    # Display chat messages from session state. Messages are always strings,
+    # so render them with st.markdown directly rather than st.write's dispatch
+    chat_container = st.container()
+    with chat_container:
+        for message in st.session_state.messages:
+            with st.chat_message(message["role"]):
+                st.markdown(message["content"])
 
-if prompt := st.chat_input("Ask a question about your documents..."):
-    # Add user message to chat history
-    st.session_state.messages.append({"role": "user", "content": prompt})
+    if prompt := st.chat_input("Ask a question about your documents..."):
+        # Add user message to chat history
+        st.session_state.messages.append({"role": "user", "content": prompt})
     
-    # Display user message
-    with st.chat_message("user"):
-        st.write(prompt)
+        # Append the new turn to the history container
+        with chat_container:
+            # Display user message
+            with st.chat_message("user"):
+                st.markdown(prompt)
     
-    # Generate and display assistant response
-    with st.chat_message("assistant"):
-        if not st.session_state.chatbot:
-            response = "Please initialize the chatbot with your OpenAI API key first."
-        elif not st.session_state.documents_loaded:
-            response = "Please upload and process documents before asking questions."
-        else:
-            # Initialize placeholder for the response
-            message_placeholder = st.empty()
+        # Generate and display assistant response
+        with chat_container, st.chat_message("assistant"):
+            if not st.session_state.chatbot:
+                response = "Please initialize the chatbot with your OpenAI API key first."
+            elif st.session_state.processing_job is not None:
+                # The background job is updating the chatbot's vector store and caches
+                response = "Documents are still being processed. Please ask again once processing finishes."
+            elif not st.session_state.documents_loaded:
+                response = "Please upload and process documents before asking questions."
+            else:
+                # Initialize placeholder for the response
+                message_placeholder = st.empty()
             
-            try:
-                # Simulate streaming in a Streamlit-friendly way
-                # First, get the complete response
-                with st.spinner("Thinking..."):
-                    top_k = st.session_state.get("top_k", 6)
-                    full_response = st.session_state.chatbot.ask_sync(prompt, top_k=top_k)
+                try:
+                    # Simulate streaming in a Streamlit-friendly way
+                    # First, get the complete response
+                    with st.status("Thinking...", expanded=False) as status:
+                        top_k = st.session_state.get("top_k", 6)
+                        full_response = run_sync(st.session_state.chatbot.ask(prompt, top_k=top_k))
+                        status.update(label="Answer ready", state="complete")
                 
-                # Then display it character by character to simulate streaming
-                displayed_response = ""
-                for char in full_response:
-                    displayed_response += char
-                    message_placeholder.markdown(displayed_response + "▌")
-                    time.sleep(0.003)  # Small delay for streaming effect
+                    # Then display it in small chunks to simulate streaming
+                    # (one rerender per chunk rather than per character)
+                    for i in range(0, len(full_response), STREAM_CHUNK_SIZE):
+                        message_placeholder.markdown(full_response[:i + STREAM_CHUNK_SIZE] + "▌")
+                        time.sleep(0.01)  # Small delay for streaming effect
                 
-                # Final display without cursor
-                message_placeholder.markdown(full_response)
-                response = full_response
-            except Exception as e:
-                response = f"Error generating response: {str(e)}"
-                message_placeholder.markdown(response)
+                    # Final display without cursor
+                    message_placeholder.markdown(full_response)
+                    response = full_response
+                except Exception as e:
+                    response = f"Error generating response: {str(e)}"
+                    message_placeholder.markdown(response)
+        
+        # Add assistant response to chat history
+        st.session_state.messages.append({"role": "assistant", "content": response})
         
-    # Add assistant response to chat history
-    st.session_state.messages.append({"role": "assistant", "content": response})
+        # Keep only a sliding window of recent messages
+        st.session_state.messages = st.session_state.messages[-MAX_CHAT_MESSAGES:]
+
+# Report on background document processing. Defined after the sidebar so a
+# job submitted in this run turns on polling (once a second) straight away
+@st.fragment(run_every=1 if st.session_state.processing_job else None)
+def check_processing_job():
+    job = st.session_state.processing_job
+    if job is None:
+        return
+    
+    future = job["future"]
+    if not future.done():
+        st.status(f"Processing {job['num_files']} documents...", state="running", expanded=False)
+        return
+    
+    st.session_state.processing_job = None
+    seen_hashes = st.session_state.seen_hashes.get(job["document_base_name"], set())
+    try:
+        num_chunks, indexed_hashes = future.result()
+        # Files that failed to parse or had no text can be submitted again
+        seen_hashes.difference_update(set(job["content_hashes"]) - set(indexed_hashes))
+        st.session_state.document_base_manager.flush()
+        if num_chunks:
+            st.session_state.documents_loaded = True
+        _list_bases.clear()
+        st.session_state.pending_toast = (
+            f"Successfully processed {len(indexed_hashes)} of {job['num_files']} documents with {num_chunks} chunks.", "✅"
+        )
+    except Exception as e:
+        # Allow the failed files to be submitted again
+        seen_hashes.difference_update(job["content_hashes"])
+        st.session_state.pending_toast = (f"Error processing documents: {str(e)}", "❌")
+    
+    # Rerun the whole app (not just this fragment) so the sidebar and chat
+    # pick up the new state and polling stops; the toast is shown by that run
+    st.rerun()
+
+check_processing_job()
+
+render_chat()
 
 # Instructions if no documents loaded
 if not st.session_state.documents_loaded:
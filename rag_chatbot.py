@@ -4,8 +4,15 @@ Integrates document processing, vector database, and OpenAI API for question ans
 """
 
 import os
+import re
 import time 
-from typing import List, Dict, Any, Optional, Tuple
+import asyncio
+import hashlib
+import multiprocessing
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Tuple, Union, BinaryIO
 
 # LangChain components
 from langchain_openai import ChatOpenAI
@@ -19,9 +26,23 @@ from langchain_core.callbacks import BaseCallbackHandler
 
 # Local modules
 from utils.document_processor import DocumentProcessor
-from utils.vector_store import VectorStore
+from utils.vector_store import VectorStore, DEFAULT_RESULTS_NUM
 from utils.prompt_loader import load_prompt
 from utils.document_base_manager import DocumentBaseManager
+from utils.query_cache import SemanticQueryCache
+from utils.fs import path_exists
+from utils.event_loop import run_sync
+
+# Number of recent query embeddings kept for reuse
+QUERY_EMBEDDING_CACHE_SIZE = 50
+
+# Words that refer back to earlier turns; questions without any are treated
+# as standalone and skip the rewriter
+_ANAPHORA_RE = re.compile(
+    r"\b(it|its|this|that|these|those|they|them|their|he|him|his|she|her|"
+    r"there|above|previous|earlier|former|latter|same|also|too|more)\b",
+    re.I
+)
 
 class StreamingCallbackHandler(BaseCallbackHandler):
     """Callback handler for streaming LLM responses."""
@@ -36,6 +57,55 @@ class StreamingCallbackHandler(BaseCallbackHandler):
     def get_text(self):
         return self.text
 
+async def batched_stream(generator, max_tokens: int = 32, max_delay_s: float = 0.025):
+    """
+    Coalesce a token stream into larger chunks.
+    
+    Tokens are buffered and yielded joined once max_tokens have accumulated or
+    max_delay_s has passed since the first buffered token, whichever comes first.
+    
+    Args:
+        generator: Async generator of token strings
+        max_tokens: Maximum number of tokens per chunk
+        max_delay_s: Maximum time a token waits in the buffer (seconds)
+    """
+    loop = asyncio.get_running_loop()
+    buffer = []
+    deadline = None
+    # The pending step is kept across flushes rather than cancelled on
+    # timeout (as asyncio.wait_for would), which would abort the stream
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(generator.__anext__())
+            
+            timeout = max(deadline - loop.time(), 0) if buffer else None
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                yield "".join(buffer)
+                buffer = []
+                continue
+            
+            step, pending = pending, None
+            try:
+                token = step.result()
+            except StopAsyncIteration:
+                break
+            
+            if not buffer:
+                deadline = loop.time() + max_delay_s
+            buffer.append(token)
+            if len(buffer) >= max_tokens:
+                yield "".join(buffer)
+                buffer = []
+        
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None:
+            pending.cancel()
+
 class RAGChatbot:
     """
     A Retrieval-Augmented Generation (RAG) chatbot that uses OpenAI API
@@ -50,7 +120,9 @@ class RAGChatbot:
                 chunk_size: int = 1000,
                 chunk_overlap: int = 200,
                 document_base_name: Optional[str] = None,
-                document_base_manager: Optional[DocumentBaseManager] = None):
+                document_base_manager: Optional[DocumentBaseManager] = None,
+                cache_threshold: float = 0.95,
+                cache_capacity: int = 256):
         
         self.openai_api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
         
@@ -72,7 +144,7 @@ class RAGChatbot:
                 persist_directory = self.document_base_manager.get_document_base_path(document_base_name)
                 
                 # Check if this directory already has vector store data
-                chroma_exists = os.path.exists(os.path.join(persist_directory, "chroma.sqlite3"))
+                chroma_exists = path_exists(os.path.join(persist_directory, "chroma.sqlite3"))
             except KeyError:
                 print(f"Warning: Document base '{document_base_name}' not found. Using default directory.")
         
@@ -96,77 +168,115 @@ class RAGChatbot:
             streaming=True
         )
         
-        # Initialize retriever as None first
-        self.retriever = None
+        # Conversation history, bounded to the 3 most recent exchanges to
+        # avoid exceeding context limits, plus its prompt formatting which is
+        # regenerated only when a turn is added
+        self.conversation_history = deque(maxlen=3)
+        self._history_cache = "No previous conversation."
         
-        # Conversation history
-        self.conversation_history = []
+        # The last 3 exchanges as LangChain messages for the query rewriter
+        self._lc_messages = deque(maxlen=6)
+        
+        # Recent query embeddings keyed by content hash (LRU)
+        self._query_embeddings = OrderedDict()
+        
+        # Answers to previous questions, looked up by embedding similarity.
+        # Only valid for the current documents and top k, so cleared when either changes
+        self.answer_cache = SemanticQueryCache(threshold=cache_threshold, capacity=cache_capacity)
+        self._answer_cache_k = None
         
         # Load prompts from yaml
         self.query_rewriter_prompt = load_prompt("query_rewriter")
         self.qa_prompt = load_prompt("qa_system")
         
-        # Initialize the QA chain as None
-        self.qa_chain = None
-        self.rewriter_chain = None
+        # Create the query rewriter chain
+        self.rewriter_chain = (
+            self.query_rewriter_prompt | self.llm | StrOutputParser()
+        )
+        
+        # Define the RAG pipeline with streaming support
+        # Takes {"question", "context"}; retrieval happens in ask() so the chain
+        # doesn't depend on the document base and is built only once
+        self.qa_chain = (
+            {
+                "context": itemgetter("context"),
+                "question": itemgetter("question"),
+                "history": lambda _: self._format_history_for_prompt()
+            }
+            | self.qa_prompt
+            | self.llm
+            | StrOutputParser()
+        )
         
-        # Now set up retriever and chains if loading existing data
-        if chroma_exists:
-            self.retriever = self.vector_store.get_retriever()
-            self._create_qa_chain()
+        # Whether the vector store holds documents to answer from; retrieval
+        # itself happens in ask() by precomputed query embedding, so existing
+        # data can be queried straight away
+        self.has_documents = chroma_exists
     
     def load_documents(self, file_paths: List[str] = None, directory_path: str = None,
-                       document_base_name: Optional[str] = None):
+                       document_base_name: Optional[str] = None, batch_size: int = 256):
         """
         Load and process documents from files or a directory.
         
+        Files given in file_paths are parsed in parallel worker processes
+        (RAG_LOAD_WORKERS environment variable, default: CPU count - 1), or
+        in-process when only one worker would be used.
+        
         Args:
             file_paths: List of file paths to process
             directory_path: Directory path containing documents to process
             document_base_name: Name of document base to save to (creates new if doesn't exist)
+            batch_size: Number of chunks embedded per embeddings request
                 
         Returns:
             Number of documents loaded
         """
         # If document base specified, switch to it or create new
         if document_base_name:
-            if document_base_name != self.current_document_base:
-                try:
-                    # Try to get existing document base
-                    base_path = self.document_base_manager.get_document_base_path(document_base_name)
-                    self._switch_document_base(document_base_name)
-                except KeyError:
-                    # Create new document base
-                    base_path = self.document_base_manager.create_document_base(document_base_name)
-                    self.current_document_base = document_base_name
-                    
-                    # Reinitialize vector store with new path
-                    self.vector_store = VectorStore(
-                        persist_directory=base_path,
-                        openai_api_key=self.openai_api_key
-                    )
+            self._use_document_base(document_base_name)
 
         processed_chunks = []
         metadatas = []
         file_count = 0
         
-        # Process individual files
+        # Process individual files. Parsing and chunking are CPU-bound and
+        # independent per file, so spread them over worker processes
         if file_paths:
-            for file_path in file_paths:
-                try:
-                    chunks = self.document_processor.process_file(file_path)
-                    file_name = os.path.basename(file_path)
-                    
-                    # Create metadata for each chunk
-                    file_metadatas = [{"source": file_name, "file_path": file_path} for _ in chunks]
-                    
-                    processed_chunks.extend(chunks)
-                    metadatas.extend(file_metadatas)
-                    file_count+=1
-                    
-                    print(f"Processed {file_name}: {len(chunks)} chunks extracted")
-                except Exception as e:
-                    print(f"Error processing {file_path}: {str(e)}")
+            workers = int(os.environ.get("RAG_LOAD_WORKERS", (os.cpu_count() or 2) - 1))
+            workers = max(1, min(workers, len(file_paths)))
+            parsed_files = []
+            if workers > 1:
+                # Spawn rather than fork: this process may already be running
+                # threads (the shared event loop, embedding workers), and a
+                # forked child can deadlock on a lock copied mid-use
+                mp_context = multiprocessing.get_context("spawn")
+                with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+                    futures = [pool.submit(self.document_processor.process_file, file_path)
+                               for file_path in file_paths]
+                    for file_path, future in zip(file_paths, futures):
+                        try:
+                            parsed_files.append((file_path, future.result()))
+                        except Exception as e:
+                            print(f"Error processing {file_path}: {str(e)}")
+            else:
+                # No parallelism to gain, so skip process startup and pickling
+                for file_path in file_paths:
+                    try:
+                        parsed_files.append((file_path, self.document_processor.process_file(file_path)))
+                    except Exception as e:
+                        print(f"Error processing {file_path}: {str(e)}")
+            
+            for file_path, chunks in parsed_files:
+                file_name = os.path.basename(file_path)
+                
+                # Chunks of a file share one (read-only) metadata dict
+                file_metadatas = [{"source": file_name, "file_path": file_path}] * len(chunks)
+                
+                processed_chunks.extend(chunks)
+                metadatas.extend(file_metadatas)
+                file_count+=1
+                
+                print(f"Processed {file_name}: {len(chunks)} chunks extracted")
         
         # Process all files in directory and subdirectories
         if directory_path:
@@ -177,8 +287,8 @@ class RAGChatbot:
                     # Construct full file path
                     file_path = os.path.join(directory_path, rel_path)
                     
-                    # Create metadata for each chunk
-                    file_metadatas = [{"source": rel_path, "file_path": file_path} for _ in chunks]
+                    # Chunks of a file share one (read-only) metadata dict
+                    file_metadatas = [{"source": rel_path, "file_path": file_path}] * len(chunks)
                     
                     processed_chunks.extend(chunks)
                     metadatas.extend(file_metadatas)
@@ -189,26 +299,131 @@ class RAGChatbot:
                 print(f"Error processing directory {directory_path}: {str(e)}")
         
         # Add processed chunks to vector store
-        if processed_chunks:
-            self.vector_store.add_texts(processed_chunks, metadatas)
-            print(f"Added {len(processed_chunks)} chunks to vector store")
+        self._add_chunks(processed_chunks, metadatas, file_count,
+                         documents=file_paths if file_paths else [],
+                         batch_size=batch_size)
+        
+        return len(processed_chunks)
 
-            # Update document base metadata if using a document base
-            if self.current_document_base:
-                self.document_base_manager.update_document_base(
-                    self.current_document_base,
-                    num_documents=file_count,
-                    num_chunks=len(processed_chunks),
-                    documents=file_paths if file_paths else []
-                )
-            
-            # Create retriever
-            self.retriever = self.vector_store.get_retriever()
+    def load_documents_from_bytes(self, files: List[Tuple[str, Union[bytes, BinaryIO]]],
+                                  document_base_name: Optional[str] = None,
+                                  batch_size: int = 256,
+                                  content_hashes: Optional[List[str]] = None):
+        """
+        Load and process in-memory documents without staging them on disk.
+        
+        Args:
+            files: List of (file name, file contents) pairs to process; contents may be
+                bytes or a seekable binary stream such as an uploaded file
+            document_base_name: Name of document base to save to (creates new if doesn't exist)
+            batch_size: Number of chunks embedded per embeddings request
+            content_hashes: Optional content hash for each file, recorded in the
+                document base so identical uploads can be skipped later
+                
+        Returns:
+            Tuple of (number of chunks loaded, content hashes of the files that were
+            indexed); files that failed to parse or yielded no text are left out
+        """
+        # If document base specified, switch to it or create new
+        if document_base_name:
+            self._use_document_base(document_base_name)
+
+        processed_chunks = []
+        metadatas = []
+        file_names = []
+        processed_hashes = []
+        
+        for i, (file_name, data) in enumerate(files):
+            try:
+                chunks = self.document_processor.process_bytes(file_name, data)
+                if not chunks:
+                    print(f"Skipped {file_name}: no text extracted")
+                    continue
+                
+                # Chunks of a file share one (read-only) metadata dict
+                file_metadatas = [{"source": file_name}] * len(chunks)
+                
+                processed_chunks.extend(chunks)
+                metadatas.extend(file_metadatas)
+                file_names.append(file_name)
+                if content_hashes:
+                    processed_hashes.append(content_hashes[i])
+                
+                print(f"Processed {file_name}: {len(chunks)} chunks extracted")
+            except Exception as e:
+                print(f"Error processing {file_name}: {str(e)}")
+        
+        # Add processed chunks to vector store
+        self._add_chunks(processed_chunks, metadatas, len(file_names),
+                         documents=file_names, batch_size=batch_size,
+                         content_hashes=processed_hashes)
+        
+        return len(processed_chunks), processed_hashes
+
+    def _use_document_base(self, document_base_name: str) -> None:
+        """
+        Make the given document base current, creating it if it doesn't exist.
+        
+        Args:
+            document_base_name: Name of document base to use
+        """
+        if document_base_name == self.current_document_base:
+            return
+        
+        try:
+            # Try to switch to an existing document base
+            self._switch_document_base(document_base_name)
+        except KeyError:
+            # Create new document base
+            base_path = self.document_base_manager.create_document_base(document_base_name)
+            self.document_base_manager.flush()
+            self.current_document_base = document_base_name
+            self.has_documents = False
+            self.answer_cache.clear()
             
-            # Create QA chain
-            self._create_qa_chain()
+            # Reinitialize vector store with new path
+            self.vector_store = VectorStore(
+                persist_directory=base_path,
+                openai_api_key=self.openai_api_key
+            )
+
+    def _add_chunks(self, processed_chunks: List[str], metadatas: List[Dict[str, Any]],
+                    file_count: int, documents: List[str], batch_size: int,
+                    content_hashes: Optional[List[str]] = None) -> None:
+        """
+        Add processed chunks to the vector store and record them in the document base.
         
-        return len(processed_chunks)
+        Args:
+            processed_chunks: Text chunks to add
+            metadatas: Metadata for each chunk
+            file_count: Number of files the chunks came from
+            documents: Names or paths of the files the chunks came from
+            batch_size: Number of chunks embedded per embeddings request
+            content_hashes: Content hashes of the files the chunks came from
+        """
+        if not processed_chunks:
+            return
+        
+        # The vector store embeds in concurrent batches and writes them in order
+        self.vector_store.add_texts(processed_chunks, metadatas, batch_size=batch_size)
+        print(f"Added {len(processed_chunks)} chunks to vector store")
+        
+        # Cached answers don't account for the new documents
+        self.answer_cache.clear()
+
+        # Update document base metadata if using a document base
+        if self.current_document_base:
+            self.document_base_manager.update_document_base(
+                self.current_document_base,
+                num_documents=file_count,
+                num_chunks=len(processed_chunks),
+                documents=documents,
+                content_hashes=content_hashes
+            )
+            # Persist right away so metadata can't fall behind the vector store
+            self.document_base_manager.flush()
+        
+        self.has_documents = True
 
     def _switch_document_base(self, document_base_name: str) -> None:
         """
@@ -223,6 +438,9 @@ class RAGChatbot:
         # Get path for the document base
         base_path = self.document_base_manager.get_document_base_path(document_base_name)
         
+        # Check for vector store data before Chroma creates an empty database
+        has_documents = path_exists(os.path.join(base_path, "chroma.sqlite3"))
+        
         # Reinitialize vector store with new document base
         self.vector_store = VectorStore(
             persist_directory=base_path,
@@ -231,10 +449,9 @@ class RAGChatbot:
         
         # Update current document base
         self.current_document_base = document_base_name
+        self.answer_cache.clear()
         
-        # Reset retriever and QA chain
-        self.retriever = self.vector_store.get_retriever()
-        self._create_qa_chain()
+        self.has_documents = has_documents
         
         print(f"Switched to document base: {document_base_name}")
     
@@ -246,65 +463,35 @@ class RAGChatbot:
         """Get the name of the currently loaded document base"""
         return self.current_document_base
     
-    def _create_qa_chain(self):
-        """
-        Create the question-answering chain using LangChain with streaming support.
-        """
-        # Create the query rewriter chain
-        self.rewriter_chain = (
-            self.query_rewriter_prompt | self.llm | StrOutputParser()
-        )
-        
-        # Define the RAG pipeline with streaming support
-        self.qa_chain = (
-            {
-                "context": self.retriever,
-                "question": RunnablePassthrough(),
-                "history": lambda _: self._format_history_for_prompt()
-            }
-            | self.qa_prompt
-            | self.llm
-            | StrOutputParser()
+    def _push_turn(self, question: str, answer: str) -> None:
+        """Add an exchange to the conversation history and refresh the formatted history."""
+        self.conversation_history.append((question, answer))
+        self._lc_messages.append(HumanMessage(content=question))
+        self._lc_messages.append(AIMessage(content=answer))
+        self._history_cache = "\n\n".join(
+            f"Question {i}: {q}\nAnswer {i}: {a}"
+            for i, (q, a) in enumerate(self.conversation_history, start=1)
         )
     
     def _format_history_for_prompt(self) -> str:
         """Format conversation history for inclusion in the prompt."""
-        if not self.conversation_history:
-            return "No previous conversation."
-            
-        formatted_history = ""
-        for i, (question, answer) in enumerate(self.conversation_history):
-            formatted_history += f"Question {i+1}: {question}\n"
-            formatted_history += f"Answer {i+1}: {answer}\n\n"
-        
-        # Limit the history length to avoid exceeding context limits
-        # Take only the most recent 3 exchanges if history is long
-        if len(self.conversation_history) > 3:
-            recent_history = self.conversation_history[-3:]
-            formatted_history = "...\n"
-            for i, (question, answer) in enumerate(recent_history):
-                idx = len(self.conversation_history) - 3 + i + 1
-                formatted_history += f"Question {idx}: {question}\n"
-                formatted_history += f"Answer {idx}: {answer}\n\n"
-        
-        return formatted_history.strip()
+        return self._history_cache
     
     def _convert_to_langchain_messages(self) -> List:
-        """Convert conversation history to LangChain message format for the rewriter."""
-        messages = []
-        for question, answer in self.conversation_history:
-            messages.append(HumanMessage(content=question))
-            messages.append(AIMessage(content=answer))
-        return messages
+        """Get the recent conversation history in LangChain message format for the rewriter."""
+        return list(self._lc_messages)
     
     async def _rewrite_question(self, question: str) -> str:
         """Rewrite contextual questions to standalone questions using conversation history."""
         if not self.conversation_history:
             return question  # No history to use for rewriting
         
+        if not _ANAPHORA_RE.search(question):
+            return question  # Already standalone, skip the LLM call
+        
         try:
             history_messages = self._convert_to_langchain_messages()
-            rewritten_question = self.rewriter_chain.invoke({
+            rewritten_question = await self.rewriter_chain.ainvoke({
                 "history": history_messages,
                 "question": question
             })
@@ -317,37 +504,78 @@ class RAGChatbot:
             print(f"Error rewriting question: {str(e)}")
             return question  # Fall back to original question
     
-    async def ask(self, question: str, streaming=False):
+    async def _embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing the vector if the same text was embedded recently."""
+        key = hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
+        if key in self._query_embeddings:
+            self._query_embeddings.move_to_end(key)
+            return self._query_embeddings[key]
+        
+        (embedding,) = await self.vector_store.aembed_queries([text])
+        self._query_embeddings[key] = embedding
+        if len(self._query_embeddings) > QUERY_EMBEDDING_CACHE_SIZE:
+            self._query_embeddings.popitem(last=False)
+        return embedding
+    
+    async def ask(self, question: str, streaming=False, top_k: Optional[int] = None):
         """
         Ask a question and get an answer based on the loaded documents.
         
         Args:
             question: The question to ask
             streaming: Whether to use streaming
+            top_k: Number of document chunks to retrieve (overrides default)
             
         Returns:
             Answer to the question or tuple of (handler, async_generator) for streaming
         """
-        if not self.retriever or not self.qa_chain:
+        if not self.has_documents:
             return "Please load documents first using the load_documents method."
         
+        k = top_k or DEFAULT_RESULTS_NUM
+        
         try:
-            # Rewrite the question if it's a contextual follow-up
-            rewritten_question = await self._rewrite_question(question)
+            # Rewrite the question if it's a contextual follow-up, embedding the
+            # original question concurrently. The rewrite usually returns the
+            # question unchanged, in which case that embedding is reused.
+            rewritten_question, query_embedding = await asyncio.gather(
+                self._rewrite_question(question),
+                self._embed_query(question)
+            )
+            if rewritten_question.strip() != question.strip():
+                query_embedding = await self._embed_query(rewritten_question)
+            
+            if k != self._answer_cache_k:
+                self.answer_cache.clear()
+                self._answer_cache_k = k
+            
+            # Answer repeated or paraphrased questions from the cache,
+            # skipping retrieval and generation
+            if not streaming:
+                cached_answer = self.answer_cache.lookup(query_embedding)
+                if cached_answer is not None:
+                    self._push_turn(question, cached_answer)
+                    return cached_answer
+            
+            # Search with the precomputed embedding instead of re-embedding
+            context = self.vector_store.similarity_search_by_vector(query_embedding, k=k)
+            inputs = {"question": rewritten_question, "context": context}
             
             if streaming:
                 # Create the callback handler for streaming
                 handler = StreamingCallbackHandler()
                 # Create config with the handler
                 config = RunnableConfig(callbacks=[handler])
-                # Return both the handler and the async generator
-                generator = self.qa_chain.astream(rewritten_question, config=config)
-                return handler, generator
+                # Return both the handler and the async generator, with
+                # tokens coalesced into fewer, larger chunks
+                generator = self.qa_chain.astream(inputs, config=config)
+                return handler, batched_stream(generator)
             else:
                 # Non-streaming path
-                answer = self.qa_chain.invoke(rewritten_question)
+                answer = await self.qa_chain.ainvoke(inputs)
+                self.answer_cache.add(query_embedding, answer)
                 # Add to conversation history
-                self.conversation_history.append((question, answer))
+                self._push_turn(question, answer)
                 return answer
         except Exception as e:
             return f"Error generating answer: {str(e)}"
@@ -355,37 +583,35 @@ class RAGChatbot:
     def ask_sync(self, question: str, streaming=False, top_k=None):
         """
         Synchronous version of ask method for compatibility.
-        streaming: Whether to use streaming
+        streaming: Ignored; answers are always returned whole
         top_k: Number of document chunks to retrieve (overrides default)
         """
-        import asyncio
-        
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            if streaming:
-                # Not easily doable synchronously
-                # Just use non-streaming version
-                return loop.run_until_complete(self.ask(question, streaming=False, top_k=top_k))
-            else:
-                return loop.run_until_complete(self.ask(question, streaming=False, top_k=top_k))
-        finally:
-            loop.close()
+        return run_sync(self.ask(question, top_k=top_k))
     
     def clear_documents(self):
         """
         Clear all documents from the vector store.
         """
         self.vector_store.clear()
-        self.retriever = None
-        self.qa_chain = None
+        self.has_documents = False
+        self.answer_cache.clear()
+        
+        # Reset document base metadata so its documents can be indexed again
+        if self.current_document_base:
+            try:
+                self.document_base_manager.reset_document_base(self.current_document_base)
+                self.document_base_manager.flush()
+            except KeyError:
+                pass
         print("All documents have been cleared from the vector store")
     
     def clear_history(self):
         """
         Clear conversation history.
         """
-        self.conversation_history = []
+        self.conversation_history.clear()
+        self._history_cache = "No previous conversation."
+        self._lc_messages.clear()
         print("Conversation history has been cleared")
 
 
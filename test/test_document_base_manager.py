@@ -0,0 +1,106 @@
+"""
+Test script for the DocumentBaseManager module
+"""
+
+import os
+import shutil
+import tempfile
+
+import orjson
+
+from utils.document_base_manager import DocumentBaseManager
+
+def test_document_base_manager():
+    """Test the DocumentBaseManager class functionality"""
+    print("Testing DocumentBaseManager functionality")
+
+    base_directory = tempfile.mkdtemp()
+    try:
+        # A legacy single-file catalog is migrated into the index and per-base records
+        legacy = {
+            "Legacy Base": {
+                "created_at": "2024-01-01T00:00:00",
+                "updated_at": "2024-01-01T00:00:00",
+                "description": "Old catalog",
+                "directory": "Legacy_Base_1",
+                "num_documents": 1,
+                "num_chunks": 3,
+                "documents": ["old.pdf"],
+                "content_hashes": ["hash-old"]
+            }
+        }
+        os.makedirs(os.path.join(base_directory, "Legacy_Base_1"))
+        with open(os.path.join(base_directory, "metadata.json"), "wb") as f:
+            f.write(orjson.dumps(legacy))
+
+        manager = DocumentBaseManager(base_directory)
+        assert not os.path.exists(os.path.join(base_directory, "metadata.json"))
+        assert os.path.exists(os.path.join(base_directory, "index.json"))
+        assert os.path.exists(os.path.join(base_directory, "Legacy_Base_1", "meta.json"))
+        assert manager.get_document_base("Legacy Base") == legacy["Legacy Base"]
+        print("Legacy metadata migrated")
+
+        # The index only holds summary fields; documents and hashes live in the record
+        with open(os.path.join(base_directory, "index.json"), "rb") as f:
+            index = orjson.loads(f.read())
+        assert "documents" not in index["Legacy Base"]
+        assert "content_hashes" not in index["Legacy Base"]
+        assert index["Legacy Base"]["num_chunks"] == 3
+
+        # Changes stay in memory until flushed
+        path = manager.create_document_base("New Base", "Fresh")
+        manager.update_document_base("New Base", num_documents=2, num_chunks=5,
+                                     documents=["a/one.pdf", "two.docx"],
+                                     content_hashes=["hash-1", "hash-2"])
+        assert "New Base" not in DocumentBaseManager(base_directory).index
+        manager.flush()
+        print("Writes are deferred until flush")
+
+        # Index and records round-trip through a fresh manager
+        reloaded = DocumentBaseManager(base_directory)
+        assert reloaded.get_document_base_path("New Base") == path
+        assert reloaded.get_content_hashes("New Base") == ["hash-1", "hash-2"]
+        assert reloaded.get_document_base("New Base")["documents"] == ["one.pdf", "two.docx"]
+        summary = {base["name"]: base for base in reloaded.list_document_bases()}
+        assert summary["New Base"]["num_documents"] == 2
+        assert summary["New Base"]["num_chunks"] == 5
+        assert summary["Legacy Base"]["description"] == "Old catalog"
+        print("Index and records round-trip")
+
+        # Renaming keeps the directory and record
+        reloaded.rename_document_base("New Base", "Renamed Base")
+        reloaded.flush()
+        reloaded = DocumentBaseManager(base_directory)
+        assert "New Base" not in reloaded.index
+        assert reloaded.get_document_base_path("Renamed Base") == path
+        assert reloaded.get_content_hashes("Renamed Base") == ["hash-1", "hash-2"]
+        print("Rename works")
+
+        # Resetting clears counts and hashes
+        reloaded.reset_document_base("Renamed Base")
+        reloaded.flush()
+        reloaded = DocumentBaseManager(base_directory)
+        assert reloaded.get_content_hashes("Renamed Base") == []
+        summary = {base["name"]: base for base in reloaded.list_document_bases()}
+        assert summary["Renamed Base"]["num_chunks"] == 0
+        print("Reset works")
+
+        # Deleting removes the directory and the index entry
+        reloaded.delete_document_base("Renamed Base")
+        reloaded.flush()
+        assert not os.path.exists(path)
+        reloaded = DocumentBaseManager(base_directory)
+        assert "Renamed Base" not in reloaded.index
+        try:
+            reloaded.get_document_base_path("Renamed Base")
+            assert False, "Expected KeyError for a deleted document base"
+        except KeyError:
+            pass
+        print("Delete works")
+    finally:
+        shutil.rmtree(base_directory, ignore_errors=True)
+
+    print("\nDocumentBaseManager test completed successfully")
+
+if __name__ == "__main__":
+    test_document_base_manager()
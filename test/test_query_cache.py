@@ -0,0 +1,41 @@
+"""
+Test script for the SemanticQueryCache module
+"""
+
+from utils.query_cache import SemanticQueryCache
+
+def test_query_cache():
+    """Test the SemanticQueryCache class functionality"""
+    print("Testing SemanticQueryCache functionality")
+    
+    cache = SemanticQueryCache(threshold=0.95, capacity=2)
+    
+    # Lookups on an empty cache miss
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+    
+    # Exact and near-duplicate embeddings hit, dissimilar ones miss
+    cache.add([1.0, 0.0, 0.0], "answer about x")
+    assert cache.lookup([1.0, 0.0, 0.0]) == "answer about x"
+    assert cache.lookup([0.99, 0.05, 0.0]) == "answer about x"
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    print("Similarity lookup works")
+    
+    # The least recently used entry is evicted when full
+    cache.add([0.0, 1.0, 0.0], "answer about y")
+    cache.lookup([1.0, 0.0, 0.0])  # touch x so y is least recently used
+    cache.add([0.0, 0.0, 1.0], "answer about z")
+    assert len(cache) == 2
+    assert cache.lookup([0.0, 1.0, 0.0]) is None
+    assert cache.lookup([1.0, 0.0, 0.0]) == "answer about x"
+    assert cache.lookup([0.0, 0.0, 1.0]) == "answer about z"
+    print("LRU eviction works")
+    
+    # Clearing removes everything
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.lookup([1.0, 0.0, 0.0]) is None
+    
+    print("\nSemanticQueryCache test completed successfully")
+
+if __name__ == "__main__":
+    test_query_cache()
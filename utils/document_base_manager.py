@@ -4,12 +4,39 @@ Handles management of persistent document bases.
 """
 
 import os
-import json
+import re
+import atexit
 import shutil
+import threading
 import time
+import weakref
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
+import orjson
+
+from .fs import path_exists
+
+# Fields of a document base record kept in the top-level index; the full
+# record (including document names and content hashes) lives in the base's
+# own directory and is only read when needed
+INDEX_FIELDS = ("created_at", "updated_at", "description", "directory",
+                "num_documents", "num_chunks")
+
+# Replace every non-alphanumeric character when deriving directory names:
+# a translation table for ASCII names, a regex for anything else
+_SAFE_NAME_TABLE = str.maketrans({chr(i): "_" for i in range(128) if not chr(i).isalnum()})
+_SAFE_NAME_RE = re.compile(r"\W")
+
+# Live managers, flushed by a single exit hook; held weakly so managers that
+# are no longer used can be garbage collected instead of living until exit
+_managers = weakref.WeakSet()
+
+@atexit.register
+def _flush_managers():
+    for manager in list(_managers):
+        manager.flush()
+
 class DocumentBaseManager:
     """
     A class for managing persistent document bases for the RAG chatbot.
@@ -26,21 +53,120 @@ class DocumentBaseManager:
         self.base_directory = base_directory
         os.makedirs(base_directory, exist_ok=True)
         
+        self.index_file = os.path.join(base_directory, "index.json")
         self.metadata_file = os.path.join(base_directory, "metadata.json")
+        
+        # Full records loaded from <directory>/meta.json on first access
+        self._records = {}
+        
+        # Directory path -> whether it exists, checked at most once per directory
+        self._dir_exists = {}
+        
+        # Mutations only mark the metadata dirty; it is written on flush()
+        # (and at interpreter exit) so bursts of updates coalesce into one write
+        self._dirty = False
+        self._dirty_bases = set()
+        
+        # The manager is shared across sessions and background processing
+        # threads; guards the index, records and dirty state (re-entrant
+        # because mutators call each other)
+        self._lock = threading.RLock()
+        _managers.add(self)
+        
         self._load_metadata()
     
     def _load_metadata(self):
-        """Load metadata about available document bases."""
-        if os.path.exists(self.metadata_file):
-            with open(self.metadata_file, "r") as f:
-                self.metadata = json.load(f)
+        """Load the index of available document bases."""
+        migrate = False
+        if path_exists(self.index_file):
+            self.index = self._read_json(self.index_file)
+        elif path_exists(self.metadata_file):
+            migrate = True
+            self._migrate_metadata()
         else:
-            self.metadata = {}
+            self.index = {}
+        
+        # Name -> document base directory path
+        self._path_cache = {
+            name: os.path.join(self.base_directory, info["directory"])
+            for name, info in self.index.items()
+        }
+        
+        if migrate:
+            # Write the new layout before dropping the legacy file
+            self.flush()
+            os.remove(self.metadata_file)
+    
+    def _migrate_metadata(self):
+        """Split a single legacy metadata.json into the index and per-base records."""
+        legacy = self._read_json(self.metadata_file)
+        
+        self.index = {}
+        for name, record in legacy.items():
+            self._records[name] = record
+            self._mark_dirty(name)
+    
+    @staticmethod
+    def _read_json(path: str) -> Dict[str, Any]:
+        with open(path, "rb") as f:
+            return orjson.loads(f.read())
+    
+    @staticmethod
+    def _write_json(path: str, data: Dict[str, Any]) -> None:
+        # Write compact JSON to a temporary file and swap it in, so a crash
+        # mid-write never leaves a truncated metadata file behind
+        tmp_file = f"{path}.tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(orjson.dumps(data))
+        os.replace(tmp_file, path)
+    
+    def _record_file(self, name: str) -> str:
+        return os.path.join(self.base_directory, self.index[name]["directory"], "meta.json")
+    
+    def _get_record(self, name: str) -> Dict[str, Any]:
+        """Get the full record of a document base, reading it from disk on first access."""
+        with self._lock:
+            if name not in self._records:
+                record_file = self._record_file(name)
+                if path_exists(record_file):
+                    self._records[name] = self._read_json(record_file)
+                else:
+                    self._records[name] = {**self.index[name], "documents": [], "content_hashes": []}
+            return self._records[name]
+    
+    def _base_dir_exists(self, dir_path: str) -> bool:
+        """Check whether a document base directory exists, caching the result."""
+        if dir_path not in self._dir_exists:
+            self._dir_exists[dir_path] = path_exists(dir_path)
+        return self._dir_exists[dir_path]
     
     def _save_metadata(self):
-        """Save metadata about document bases."""
-        with open(self.metadata_file, "w") as f:
-            json.dump(self.metadata, f, indent=2)
+        """Save the index and any changed document base records."""
+        for name in self._dirty_bases:
+            if name in self.index:
+                dir_path = self._path_cache[name]
+                if not self._base_dir_exists(dir_path):
+                    os.makedirs(dir_path, exist_ok=True)
+                    self._dir_exists[dir_path] = True
+                self._write_json(self._record_file(name), self._records[name])
+        self._write_json(self.index_file, self.index)
+    
+    def _mark_dirty(self, name: Optional[str] = None):
+        """Record that metadata (and optionally a base's record) has changed since the last flush."""
+        self._dirty = True
+        if name is not None:
+            # Keep the index summary in step with the full record
+            record = self._records[name]
+            self.index[name] = {field: record.get(field) for field in INDEX_FIELDS}
+            self._dirty_bases.add(name)
+    
+    def flush(self) -> None:
+        """Write metadata to disk if it has changed since the last flush."""
+        with self._lock:
+            if self._dirty:
+                self._save_metadata()
+                self._dirty = False
+                self._dirty_bases.clear()
     
     def create_document_base(self, name: str, description: str = "") -> str:
         """
@@ -56,31 +182,38 @@ class DocumentBaseManager:
         Raises:
             ValueError: If a document base with the given name already exists
         """
-        if name in self.metadata:
-            raise ValueError(f"Document base '{name}' already exists")
-        
-        # Sanitize name for directory
-        safe_name = "".join(c if c.isalnum() else "_" for c in name)
-        timestamp = int(time.time())
-        dir_name = f"{safe_name}_{timestamp}"
-        
-        # Create directory for the document base
-        doc_base_dir = os.path.join(self.base_directory, dir_name)
-        os.makedirs(doc_base_dir, exist_ok=True)
-        
-        # Record metadata
-        self.metadata[name] = {
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
-            "description": description,
-            "directory": dir_name,
-            "num_documents": 0,
-            "num_chunks": 0,
-            "documents": []
-        }
-        
-        self._save_metadata()
-        return doc_base_dir
+        with self._lock:
+            if name in self.index:
+                raise ValueError(f"Document base '{name}' already exists")
+            
+            # Sanitize name for directory
+            if name.isascii():
+                safe_name = name.translate(_SAFE_NAME_TABLE)
+            else:
+                safe_name = _SAFE_NAME_RE.sub("_", name)
+            timestamp = int(time.time())
+            dir_name = f"{safe_name}_{timestamp}"
+            
+            # Create directory for the document base
+            doc_base_dir = os.path.join(self.base_directory, dir_name)
+            os.makedirs(doc_base_dir, exist_ok=True)
+            self._dir_exists[doc_base_dir] = True
+            
+            # Record metadata
+            self._records[name] = {
+                "created_at": datetime.now().isoformat(),
+                "updated_at": datetime.now().isoformat(),
+                "description": description,
+                "directory": dir_name,
+                "num_documents": 0,
+                "num_chunks": 0,
+                "documents": [],
+                "content_hashes": []
+            }
+            
+            self._path_cache[name] = doc_base_dir
+            self._mark_dirty(name)
+            return doc_base_dir
     
     def list_document_bases(self) -> List[Dict[str, Any]]:
         """
@@ -89,17 +222,18 @@ class DocumentBaseManager:
         Returns:
             List of document base information
         """
-        result = []
-        for name, info in self.metadata.items():
-            result.append({
-                "name": name,
-                "description": info.get("description", ""),
-                "created_at": info.get("created_at"),
-                "updated_at": info.get("updated_at"),
-                "num_documents": info.get("num_documents", 0),
-                "num_chunks": info.get("num_chunks", 0)
-            })
-        return result
+        with self._lock:
+            result = []
+            for name, info in self.index.items():
+                result.append({
+                    "name": name,
+                    "description": info.get("description", ""),
+                    "created_at": info.get("created_at"),
+                    "updated_at": info.get("updated_at"),
+                    "num_documents": info.get("num_documents", 0),
+                    "num_chunks": info.get("num_chunks", 0)
+                })
+            return result
     
     def get_document_base(self, name: str) -> Dict[str, Any]:
         """
@@ -114,10 +248,10 @@ class DocumentBaseManager:
         Raises:
             KeyError: If document base doesn't exist
         """
-        if name not in self.metadata:
+        if name not in self.index:
             raise KeyError(f"Document base '{name}' not found")
         
-        return self.metadata[name]
+        return self._get_record(name)
     
     def get_document_base_path(self, name: str) -> str:
         """
@@ -132,14 +266,33 @@ class DocumentBaseManager:
         Raises:
             KeyError: If document base doesn't exist
         """
-        if name not in self.metadata:
-            raise KeyError(f"Document base '{name}' not found")
+        try:
+            return self._path_cache[name]
+        except KeyError:
+            raise KeyError(f"Document base '{name}' not found") from None
+    
+    def get_content_hashes(self, name: str) -> List[str]:
+        """
+        Get the content hashes of the documents indexed in a document base.
         
-        dir_name = self.metadata[name]["directory"]
-        return os.path.join(self.base_directory, dir_name)
+        Args:
+            name: Name of the document base
+            
+        Returns:
+            List of SHA-256 hex digests of indexed document contents
+            
+        Raises:
+            KeyError: If document base doesn't exist
+        """
+        with self._lock:
+            if name not in self.index:
+                raise KeyError(f"Document base '{name}' not found")
+            
+            return list(self._get_record(name).get("content_hashes", []))
     
     def update_document_base(self, name: str, num_documents: int = 0, 
-                             num_chunks: int = 0, documents: List[str] = None) -> None:
+                             num_chunks: int = 0, documents: List[str] = None,
+                             content_hashes: List[str] = None) -> None:
         """
         Update document base metadata after adding documents.
         
@@ -148,26 +301,54 @@ class DocumentBaseManager:
             num_documents: Number of documents added
             num_chunks: Number of chunks added
             documents: List of document paths added
+            content_hashes: SHA-256 hex digests of the added documents' contents
             
         Raises:
             KeyError: If document base doesn't exist
         """
-        if name not in self.metadata:
-            raise KeyError(f"Document base '{name}' not found")
-        
-        base_info = self.metadata[name]
-        base_info["updated_at"] = datetime.now().isoformat()
-        base_info["num_documents"] += num_documents
-        base_info["num_chunks"] += num_chunks
-        
-        if documents:
-            if "documents" not in base_info:
-                base_info["documents"] = []
+        with self._lock:
+            if name not in self.index:
+                raise KeyError(f"Document base '{name}' not found")
+            
+            base_info = self._get_record(name)
+            base_info["updated_at"] = datetime.now().isoformat()
+            base_info["num_documents"] += num_documents
+            base_info["num_chunks"] += num_chunks
             
-            # Add only filenames, not full paths
-            base_info["documents"].extend([os.path.basename(doc) for doc in documents])
+            if documents:
+                if "documents" not in base_info:
+                    base_info["documents"] = []
+                
+                # Add only filenames, not full paths
+                base_info["documents"].extend([os.path.basename(doc) for doc in documents])
+            
+            if content_hashes:
+                base_info.setdefault("content_hashes", []).extend(content_hashes)
+            
+            self._mark_dirty(name)
+    
+    def reset_document_base(self, name: str) -> None:
+        """
+        Reset document base metadata after its documents have been cleared.
         
-        self._save_metadata()
+        Args:
+            name: Name of the document base
+            
+        Raises:
+            KeyError: If document base doesn't exist
+        """
+        with self._lock:
+            if name not in self.index:
+                raise KeyError(f"Document base '{name}' not found")
+            
+            base_info = self._get_record(name)
+            base_info["updated_at"] = datetime.now().isoformat()
+            base_info["num_documents"] = 0
+            base_info["num_chunks"] = 0
+            base_info["documents"] = []
+            base_info["content_hashes"] = []
+            
+            self._mark_dirty(name)
     
     def delete_document_base(self, name: str) -> None:
         """
@@ -179,20 +360,23 @@ class DocumentBaseManager:
         Raises:
             KeyError: If document base doesn't exist
         """
-        if name not in self.metadata:
-            raise KeyError(f"Document base '{name}' not found")
-        
-        # Get directory path
-        dir_name = self.metadata[name]["directory"]
-        dir_path = os.path.join(self.base_directory, dir_name)
-        
-        # Delete directory if it exists
-        if os.path.exists(dir_path):
-            shutil.rmtree(dir_path)
-        
-        # Remove from metadata
-        del self.metadata[name]
-        self._save_metadata()
+        with self._lock:
+            if name not in self.index:
+                raise KeyError(f"Document base '{name}' not found")
+            
+            # Get directory path
+            dir_path = self._path_cache.pop(name)
+            
+            # Delete directory if it exists
+            if self._base_dir_exists(dir_path):
+                shutil.rmtree(dir_path)
+            self._dir_exists.pop(dir_path, None)
+            
+            # Remove from metadata
+            del self.index[name]
+            self._records.pop(name, None)
+            self._dirty_bases.discard(name)
+            self._mark_dirty()
     
     def rename_document_base(self, old_name: str, new_name: str) -> None:
         """
@@ -206,19 +390,23 @@ class DocumentBaseManager:
             KeyError: If document base doesn't exist
             ValueError: If new name already exists
         """
-        if old_name not in self.metadata:
-            raise KeyError(f"Document base '{old_name}' not found")
-        
-        if new_name in self.metadata:
-            raise ValueError(f"Document base '{new_name}' already exists")
-        
-        # Copy metadata
-        self.metadata[new_name] = self.metadata[old_name].copy()
-        self.metadata[new_name]["updated_at"] = datetime.now().isoformat()
-        
-        # Remove old entry
-        del self.metadata[old_name]
-        self._save_metadata()
+        with self._lock:
+            if old_name not in self.index:
+                raise KeyError(f"Document base '{old_name}' not found")
+            
+            if new_name in self.index:
+                raise ValueError(f"Document base '{new_name}' already exists")
+            
+            # Move the record; it stays in the same directory
+            self._records[new_name] = self._get_record(old_name).copy()
+            self._records[new_name]["updated_at"] = datetime.now().isoformat()
+            
+            # Remove old entry
+            del self.index[old_name]
+            del self._records[old_name]
+            self._path_cache[new_name] = self._path_cache.pop(old_name)
+            self._dirty_bases.discard(old_name)
+            self._mark_dirty(new_name)
 
 
 # Example usage
@@ -244,4 +432,7 @@ if __name__ == "__main__":
     
     # Get path to a document base
     path = manager.get_document_base_path("AI Documents")
-    print(f"Document base path: {path}")
\ No newline at end of file
+    print(f"Document base path: {path}")
+    
+    # Write pending metadata changes to disk
+    manager.flush()
\ No newline at end of file
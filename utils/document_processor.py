@@ -3,9 +3,10 @@ Document Processing Module for RAG Chatbot
 Handles extraction of text from Word documents, Excel files, and PDFs using LangChain document loaders.
 """
 
+import io
 import os
 import pandas as pd
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, BinaryIO, Union
 
 # LangChain components
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -73,6 +74,46 @@ class DocumentProcessor:
         except Exception as e:
             raise Exception(f"Error processing {file_path}: {str(e)}")
     
+    def process_bytes(self, file_name: str, data: Union[bytes, BinaryIO]) -> List[str]:
+        """
+        Process in-memory file contents based on the file name's extension and return chunked text.
+        
+        Args:
+            file_name: Name of the file, used to detect the format and as the source
+            data: Raw file contents, or a seekable binary stream over them (read in place, not copied)
+            
+        Returns:
+            List of text chunks extracted from the document
+        
+        Raises:
+            ValueError: If the file format is not supported
+        """
+        file_extension = os.path.splitext(file_name)[1].lower()
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            stream = io.BytesIO(data)
+        else:
+            stream = data
+            stream.seek(0)
+        
+        try:
+            if file_extension == '.pdf':
+                documents = self._load_pdf_stream(stream, file_name)
+            elif file_extension == '.docx':
+                documents = self._load_docx_stream(stream, file_name)
+            elif file_extension in ['.xlsx', '.xls']:
+                documents = self._load_excel(stream, source=file_name)
+            else:
+                raise ValueError(f"Unsupported file format: {file_extension}")
+            
+            # Extract text from documents
+            text = self._extract_text_from_documents(documents)
+            
+            # Split the text into chunks
+            return self.text_splitter.split_text(text)
+            
+        except Exception as e:
+            raise Exception(f"Error processing {file_name}: {str(e)}")
+    
     def process_directory(self, directory_path: str) -> Dict[str, List[str]]:
         """
         Process all supported documents in a directory and its subdirectories.
@@ -116,14 +157,31 @@ class DocumentProcessor:
         loader = Docx2txtLoader(file_path)
         return loader.load()
     
-    def _load_excel(self, file_path: str, header_row: int = 0) -> List[Document]:
+    def _load_pdf_stream(self, stream: BinaryIO, file_name: str) -> List[Document]:
+        """Load a PDF from a binary stream, one Document per page (as PyPDFLoader does)."""
+        from pypdf import PdfReader
+        
+        reader = PdfReader(stream)
+        return [
+            Document(page_content=page.extract_text(), metadata={"source": file_name, "page": i})
+            for i, page in enumerate(reader.pages)
+        ]
+    
+    def _load_docx_stream(self, stream: BinaryIO, file_name: str) -> List[Document]:
+        """Load a Word document from a binary stream (as Docx2txtLoader does)."""
+        import docx2txt
+        
+        return [Document(page_content=docx2txt.process(stream), metadata={"source": file_name})]
+    
+    def _load_excel(self, file_path, header_row: int = 0, source: Optional[str] = None) -> List[Document]:
         """
         Load an Excel file preserving headers and sheet structure.
         Uses pandas to maintain the tabular data structure and headers.
         
         Args:
-            file_path: Path to the Excel file
+            file_path: Path to the Excel file, or a binary stream with its contents
             header_row: Row index (0-based) containing the column headers (default: 0)
+            source: Source name for the metadata (defaults to file_path)
             
         Returns:
             List of Document objects with properly formatted Excel content
@@ -132,6 +190,7 @@ class DocumentProcessor:
         from langchain_core.documents import Document
         
         documents = []
+        source = source or file_path
         
         # Read all sheets in the Excel file
         excel_file = pd.ExcelFile(file_path)
@@ -139,7 +198,7 @@ class DocumentProcessor:
         
         for sheet_name in sheet_names:
             # Read the sheet into a pandas DataFrame with specified header row
-            df = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row)
+            df = excel_file.parse(sheet_name=sheet_name, header=header_row)
             
             # Skip empty sheets
             if df.empty:
@@ -164,7 +223,7 @@ class DocumentProcessor:
             doc = Document(
                 page_content=formatted_text,
                 metadata={
-                    "source": file_path,
+                    "source": source,
                     "file_type": "excel",
                     "sheet_name": sheet_name,
                     "row_count": len(df),
@@ -189,7 +248,7 @@ class DocumentProcessor:
                     chunk_doc = Document(
                         page_content=chunk_text,
                         metadata={
-                            "source": file_path,
+                            "source": source,
                             "file_type": "excel",
                             "sheet_name": sheet_name,
                             "row_range": f"{i}-{i+len(chunk_df)-1}",
@@ -0,0 +1,47 @@
+"""
+Event Loop Module for RAG Chatbot
+Runs coroutines from synchronous code on one long-lived background event loop.
+"""
+
+import asyncio
+import threading
+from typing import Any, Coroutine, Optional
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the shared background event loop, starting it on first use.
+
+    The async OpenAI clients pool their connections on the loop that first
+    used them, so every call has to go through the same, never-closed loop.
+
+    Returns:
+        The running background event loop
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=loop.run_forever, name="rag-event-loop", daemon=True)
+            thread.start()
+            _loop = loop
+    return _loop
+
+
+def run_sync(coro: Coroutine, timeout: Optional[float] = None) -> Any:
+    """
+    Run a coroutine on the shared background event loop and wait for its result.
+
+    Safe to call from any thread except the loop's own.
+
+    Args:
+        coro: Coroutine to run
+        timeout: Maximum number of seconds to wait (None waits indefinitely)
+
+    Returns:
+        The coroutine's result
+    """
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result(timeout)
@@ -0,0 +1,23 @@
+"""
+File System Helpers Module for RAG Chatbot
+Lightweight path checks for hot paths.
+"""
+
+import os
+
+
+def path_exists(path: str) -> bool:
+    """
+    Check whether a path exists with a single stat call.
+
+    Args:
+        path: File or directory path
+
+    Returns:
+        True if the path exists, otherwise False
+    """
+    try:
+        os.stat(path)
+    except (OSError, ValueError):
+        return False
+    return True
@@ -0,0 +1,25 @@
+"""
+Vector Quantization Module for RAG Chatbot
+Symmetric int8 quantization of embeddings for compact storage and fast integer similarity.
+"""
+
+from typing import List, Tuple, Union
+
+import numpy as np
+
+
+def quantize_i8(vector: Union[List[float], np.ndarray]) -> Tuple[np.ndarray, float]:
+    """
+    Quantize a vector to int8 with a per-vector symmetric scale.
+
+    Args:
+        vector: Float vector to quantize
+
+    Returns:
+        Tuple of (int8 vector, scale) such that vector ≈ int8 vector * scale
+    """
+    vector = np.asarray(vector, dtype=np.float32)
+    max_abs = float(np.max(np.abs(vector))) if vector.size else 0.0
+    scale = max_abs / 127 if max_abs else 1.0
+    quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+    return quantized, scale
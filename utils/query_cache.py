@@ -0,0 +1,93 @@
+"""
+Semantic Query Cache Module for RAG Chatbot
+Caches answers keyed by question embedding so near-duplicate questions skip retrieval and generation.
+"""
+
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from .quantize import quantize_i8
+from .sim import cosine_similarities
+
+
+class SemanticQueryCache:
+    """
+    An in-memory LRU cache of answers, looked up by cosine similarity between
+    question embeddings rather than by exact question text.
+    """
+
+    def __init__(self, threshold: float = 0.95, capacity: int = 256):
+        """
+        Initialize the SemanticQueryCache.
+
+        Args:
+            threshold: Minimum cosine similarity for a cached question to count as a hit
+            capacity: Maximum number of cached answers (least recently used are evicted)
+        """
+        self.threshold = threshold
+        self.capacity = capacity
+
+        # Row i of the matrix holds the int8-quantized embedding for slot i
+        # (a quarter of the memory of float32, and cosine similarity is
+        # unaffected by the per-vector scale); allocated on first insert
+        # once the embedding size is known
+        self._vectors = None
+        self._valid = np.zeros(capacity, dtype=bool)
+
+        # Slot -> answer, ordered from least to most recently used
+        self._answers = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._answers)
+
+    def lookup(self, embedding: List[float]) -> Optional[str]:
+        """
+        Find the cached answer for the most similar cached question.
+
+        Args:
+            embedding: Embedding of the question
+
+        Returns:
+            The cached answer if the best match reaches the threshold, otherwise None
+        """
+        if not self._answers:
+            return None
+
+        query, _ = quantize_i8(embedding)
+        similarities = cosine_similarities(query, self._vectors)
+        similarities[~self._valid] = -np.inf
+
+        slot = int(np.argmax(similarities))
+        if similarities[slot] < self.threshold:
+            return None
+
+        self._answers.move_to_end(slot)
+        return self._answers[slot]
+
+    def add(self, embedding: List[float], answer: str) -> None:
+        """
+        Cache an answer for a question embedding, evicting the least recently used entry if full.
+
+        Args:
+            embedding: Embedding of the question
+            answer: Answer to cache
+        """
+        vector, _ = quantize_i8(embedding)
+        if self._vectors is None:
+            self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.int8)
+
+        if len(self._answers) >= self.capacity:
+            slot, _ = self._answers.popitem(last=False)
+        else:
+            slot = int(np.argmin(self._valid))  # first free slot
+
+        self._vectors[slot] = vector
+        self._valid[slot] = True
+        self._answers[slot] = answer
+
+    def clear(self) -> None:
+        """Remove all cached answers."""
+        self._valid[:] = False
+        self._answers.clear()
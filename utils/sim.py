@@ -0,0 +1,53 @@
+"""
+Vector Similarity Module for RAG Chatbot
+Cosine similarity helpers using SimSIMD's SIMD kernels when available, with a NumPy fallback.
+"""
+
+import numpy as np
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+
+def cosine(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Compute the cosine similarity between two vectors.
+
+    Args:
+        a: First vector (contiguous float32 array for zero-copy SIMD)
+        b: Second vector, same dtype and length as a
+
+    Returns:
+        Cosine similarity in [-1, 1] (0 if either vector is all zeros)
+    """
+    if simsimd is not None:
+        # SimSIMD returns the cosine distance
+        return 1.0 - float(simsimd.cosine(a, b))
+
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b)) / norm if norm else 0.0
+
+
+def cosine_similarities(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """
+    Compute the cosine similarity between a query vector and every row of a matrix.
+
+    Args:
+        query: Query vector of shape (dim,)
+        matrix: Matrix of shape (n, dim), same dtype as query
+
+    Returns:
+        Float array of shape (n,) with one similarity per row
+    """
+    if simsimd is not None:
+        distances = simsimd.cdist(query.reshape(1, -1), matrix, metric="cosine")
+        return 1.0 - np.asarray(distances, dtype=np.float64).reshape(-1)
+
+    # Accumulate in float64 so integer inputs don't overflow
+    matrix = matrix.astype(np.float64, copy=False)
+    query = query.astype(np.float64, copy=False)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    dots = matrix @ query
+    return np.divide(dots, norms, out=np.zeros_like(dots), where=norms > 0)
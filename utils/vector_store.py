@@ -6,6 +6,7 @@ Handles document embedding storage and retrieval using Chroma.
 import os
 from typing import List, Dict, Any, Optional
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 
 # Updated imports for LangChain
 from langchain_openai import OpenAIEmbeddings
@@ -14,6 +15,8 @@ from langchain_core.documents import Document
 
 
 DEFAULT_RESULTS_NUM = 6
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_WORKERS = 8
 
 class VectorStore:
     """
@@ -54,29 +57,65 @@ class VectorStore:
             embedding_function=self.embeddings
         )
     
-    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+    def add_texts(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+                  batch_size: int = EMBEDDING_BATCH_SIZE,
+                  max_workers: int = EMBEDDING_WORKERS) -> List[str]:
         """
         Add text chunks to the vector store.
         
+        Texts are embedded in batches of batch_size, with up to max_workers
+        embedding requests in flight at once; each batch is then written to
+        Chroma in order as its embeddings arrive. If any batch fails, the
+        batches already written are removed again before the error is raised.
+        
         Args:
             texts: List of text chunks to add
             metadatas: Optional list of metadata dictionaries for each text chunk
+            batch_size: Number of texts per embeddings request
+            max_workers: Maximum number of concurrent embeddings requests
             
         Returns:
             List of IDs for the added documents
         """
+        if not texts:
+            return []
+        
         if not metadatas:
             metadatas = [{"source": f"doc_{i}"} for i in range(len(texts))]
         
         # Generate IDs if not provided in metadata
         ids = [str(uuid.uuid4()) for _ in range(len(texts))]
         
-        # Add texts to vector store
-        self.vector_store.add_texts(
-            texts=texts,
-            metadatas=metadatas,
-            ids=ids
-        )
+        starts = range(0, len(texts), batch_size)
+        
+        def embed_batch(start):
+            return self.embeddings.embed_documents(texts[start:start + batch_size])
+        
+        # Upsert precomputed embeddings directly rather than via
+        # Chroma.add_texts, which would embed each batch again. This relies on
+        # the private _collection attribute of the pinned langchain-chroma
+        # (0.0.1), which has no public API for adding precomputed embeddings
+        collection = self.vector_store._collection
+        written = 0
+        
+        # Embedding is network-bound, so overlap the requests; Chroma writes stay serial
+        try:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(starts))) as executor:
+                for start, embeddings in zip(starts, executor.map(embed_batch, starts)):
+                    end = start + batch_size
+                    collection.upsert(
+                        ids=ids[start:end],
+                        embeddings=embeddings,
+                        metadatas=metadatas[start:end],
+                        documents=texts[start:end]
+                    )
+                    written = min(end, len(texts))
+        except Exception:
+            # Roll back the batches already written so a failed call leaves
+            # the store as it was
+            if written:
+                collection.delete(ids=ids[:written])
+            raise
         
         # Note: Removed .persist() call as it's no longer needed in Chroma 0.4.x+
         
@@ -99,6 +138,30 @@ class VectorStore:
         
         return ids
     
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several query strings with a single embeddings request.
+        
+        Args:
+            texts: Query texts to embed
+            
+        Returns:
+            List of embedding vectors, in the same order as texts
+        """
+        return self.embeddings.embed_documents(texts)
+    
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Async version of embed_queries.
+        
+        Args:
+            texts: Query texts to embed
+            
+        Returns:
+            List of embedding vectors, in the same order as texts
+        """
+        return await self.embeddings.aembed_documents(texts)
+    
     def similarity_search(self, query: str, k: int = DEFAULT_RESULTS_NUM) -> List[Document]:
         """
         Perform similarity search for a query.
@@ -125,6 +188,19 @@ class VectorStore:
         """
         return self.vector_store.similarity_search_with_score(query, k=k)
     
+    def similarity_search_by_vector(self, embedding: List[float], k: int = DEFAULT_RESULTS_NUM) -> List[Document]:
+        """
+        Perform similarity search for a precomputed query embedding.
+        
+        Args:
+            embedding: Query embedding vector
+            k: Number of results to return
+            
+        Returns:
+            List of Document objects that are most similar to the embedding
+        """
+        return self.vector_store.similarity_search_by_vector(embedding, k=k)
+    
     def get_retriever(self, search_kwargs: Optional[Dict[str, Any]] = None):
         """
         Get a retriever for the vector store.